@@ -1,16 +1,167 @@
-from rest_framework.authentication import BaseAuthentication, BasicAuthentication
+from rest_framework.authentication import BaseAuthentication, BasicAuthentication, get_authorization_header
 from rest_framework.exceptions import AuthenticationFailed
 from django.contrib.auth import get_user_model
 from django.contrib.auth.hashers import check_password
+from django.db import DatabaseError, connections
+from django.db.models import F
 import base64
+import binascii
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
 import jwt
+from cachetools import TTLCache
 from django.conf import settings
-from datetime import datetime, timedelta
 from typing import Optional, Tuple
 from drf_spectacular.extensions import OpenApiAuthenticationExtension
 from drf_spectacular.plumbing import build_bearer_security_scheme_object
+from apps.base.redis_service import redis_service
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
+
+_KEY = settings.SECRET_KEY.encode()
+# Byte-identical to the header PyJWT emits for HS256, so tokens issued
+# before the switch to the direct HMAC path keep verifying
+_HEADER_B64 = base64.urlsafe_b64encode(b'{"alg":"HS256","typ":"JWT"}').rstrip(b'=')
+# HMAC state with the key schedule done and the header absorbed; signing
+# and verification continue from a copy instead of starting over
+_HEADER_MAC = hmac.new(_KEY, _HEADER_B64 + b'.', hashlib.sha256)
+
+
+def _b64encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b'=')
+
+
+def _b64decode(data: bytes) -> bytes:
+    return base64.urlsafe_b64decode(data + b'=' * (-len(data) % 4))
+
+
+def encode_tokens(*payloads: dict) -> Tuple[str, ...]:
+    """
+    Sign each payload as an HS256 JWT
+    """
+    tokens = []
+    for payload in payloads:
+        body = _b64encode(json.dumps(payload, separators=(',', ':')).encode())
+        mac = _HEADER_MAC.copy()
+        mac.update(body)
+        tokens.append(b'.'.join((_HEADER_B64, body, _b64encode(mac.digest()))).decode())
+    return tuple(tokens)
+
+
+def encode_token(payload: dict) -> str:
+    """
+    Sign the payload as an HS256 JWT
+    """
+    return encode_tokens(payload)[0]
+
+
+def decode_token(token: str) -> dict:
+    """
+    Verify an HS256 JWT and return its payload, raising PyJWT's exceptions
+    """
+    try:
+        header, body, signature = token.encode().split(b'.')
+    except ValueError:
+        raise jwt.DecodeError('Not enough segments')
+    
+    if header != _HEADER_B64:
+        raise jwt.InvalidAlgorithmError('The specified alg value is not allowed')
+    
+    mac = _HEADER_MAC.copy()
+    mac.update(body)
+    try:
+        valid = hmac.compare_digest(mac.digest(), _b64decode(signature))
+        payload = json.loads(_b64decode(body)) if valid else None
+    except (binascii.Error, ValueError):
+        raise jwt.DecodeError('Invalid token encoding')
+    if not valid:
+        raise jwt.InvalidSignatureError('Signature verification failed')
+    if not isinstance(payload, dict):
+        raise jwt.DecodeError('Invalid payload string: must be a json object')
+    
+    exp = payload.get('exp')
+    if exp is not None:
+        if not isinstance(exp, int):
+            raise jwt.DecodeError('Expiration Time claim (exp) must be an integer.')
+        if exp <= time.time():
+            raise jwt.ExpiredSignatureError('Signature has expired')
+    
+    return payload
+
+
+# Columns needed by permission checks and the profile endpoint; wide or
+# sensitive columns (photo, password, ...) stay deferred
+AUTH_USER_FIELDS = (
+    'id', 'phone_number', 'first_name', 'last_name', 'email',
+    'is_verified', 'is_active', 'is_staff', 'is_superuser',
+    'created_at', 'updated_at',
+)
+
+_user_cache = TTLCache(maxsize=settings.AUTH_USER_CACHE_SIZE, ttl=settings.AUTH_USER_CACHE_TTL)
+# Ids with no matching user, so tokens of deleted users do not reach the DB
+_missing_user_cache = TTLCache(
+    maxsize=settings.AUTH_MISSING_USER_CACHE_SIZE, ttl=settings.AUTH_MISSING_USER_CACHE_TTL
+)
+_user_cache_lock = threading.Lock()
+
+# Recently verified tokens, for clients that refresh several times in a row
+_token_cache = TTLCache(maxsize=settings.AUTH_TOKEN_CACHE_SIZE, ttl=settings.AUTH_TOKEN_CACHE_TTL)
+_token_cache_lock = threading.Lock()
+
+
+def get_cached_user(user_id):
+    """
+    Get user by id (or None), served from a short-lived per-process cache
+    """
+    user_id = str(user_id)
+    with _user_cache_lock:
+        if user_id in _missing_user_cache:
+            return None
+        user = _user_cache.get(user_id)
+    if user is None:
+        user = User.objects.only(*AUTH_USER_FIELDS).filter(id=user_id).first()
+        with _user_cache_lock:
+            if user is None:
+                _missing_user_cache[user_id] = True
+            else:
+                _user_cache[user_id] = user
+    return user
+
+
+def warm_user_cache(limit: int) -> None:
+    """
+    Preload the users with the most recent OTP logins into the per-process
+    cache; warmed entries still expire after AUTH_USER_CACHE_TTL
+    """
+    try:
+        users = list(
+            User.objects.only(*AUTH_USER_FIELDS)
+            .order_by(F('last_login').desc(nulls_last=True))[:limit]
+        )
+    except DatabaseError as e:
+        logger.warning("Auth cache warm-up failed: %s", e)
+        return
+    finally:
+        connections.close_all()
+    
+    with _user_cache_lock:
+        for user in users:
+            _user_cache[str(user.id)] = user
+
+
+def invalidate_cached_user(user_id) -> None:
+    """
+    Drop a user from the per-process caches
+    """
+    user_id = str(user_id)
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
+        _missing_user_cache.pop(user_id, None)
 
 
 class JWTAuthentication(BaseAuthentication):
@@ -27,22 +178,17 @@ class JWTAuthentication(BaseAuthentication):
         if not auth_header or not auth_header.startswith('Bearer '):
             return None
             
-        token = auth_header.split(' ')[1]
+        token = auth_header[7:]
         
         try:
-            payload = jwt.decode(
-                token, 
-                settings.SECRET_KEY, 
-                algorithms=['HS256']
-            )
+            payload = decode_token(token)
             
             user_id = payload.get('user_id')
             if not user_id:
                 raise AuthenticationFailed('Invalid token payload')
                 
-            try:
-                user = User.objects.get(id=user_id)
-            except User.DoesNotExist:
+            user = get_cached_user(user_id)
+            if user is None:
                 raise AuthenticationFailed('User not found')
                 
             return (user, token)
@@ -71,27 +217,38 @@ class BasicAuth(BaseAuthentication):
         """
         Authenticate using phone number and password
         """
-        auth_header = request.META.get('HTTP_AUTHORIZATION')
+        # Parsed like DRF's BasicAuthentication: case-insensitive scheme and
+        # any whitespace between scheme and credentials
+        auth = get_authorization_header(request).split()
         
-        if not auth_header or not auth_header.startswith('Basic '):
+        if not auth or auth[0].lower() != b'basic' or len(auth) != 2:
             return None
             
         try:
             # Decode the base64 encoded credentials
-            encoded_credentials = auth_header.split(' ')[1]
-            decoded_credentials = base64.b64decode(encoded_credentials).decode('utf-8')
+            decoded_credentials = base64.b64decode(auth[1]).decode('utf-8')
             phone_number, password = decoded_credentials.split(':', 1)
         except (ValueError, UnicodeDecodeError):
             return None
+        
+        # Reserve the attempt atomically before running the deliberately slow
+        # password hasher, so a concurrent burst cannot all slip under the limit
+        if redis_service.incr_auth_attempts(phone_number) > settings.AUTH_MAX_ATTEMPTS:
+            raise AuthenticationFailed('Too many login attempts. Try again later.')
             
-        try:
-            user = User.objects.get(phone_number=phone_number)
-            if check_password(password, user.password):
-                return (user, None)
-        except User.DoesNotExist:
-            pass
-            
-        return None
+        # Every path below runs the password hasher exactly once (a dummy
+        # hash for unknown numbers, like ModelBackend), so timing does not
+        # reveal which phone numbers have accounts
+        user = User.objects.filter(phone_number=phone_number).first()
+        if user is None:
+            User().set_password(password)
+        elif check_password(password, user.password):
+            # A successful login clears the counter, so concurrent valid
+            # requests cannot lock the user out
+            redis_service.reset_auth_attempts(phone_number)
+            return (user, None)
+        
+        raise AuthenticationFailed('Invalid phone number or password.')
     
     def authenticate_header(self, request):
         """
@@ -106,33 +263,48 @@ class JWTTokenGenerator:
     Utility class for generating JWT tokens
     """
     
+    @staticmethod
+    def _access_payload(user, now: int) -> dict:
+        return {
+            'user_id': str(user.id),
+            'phone_number': user.phone_number,
+            'exp': now + 7 * 24 * 60 * 60,  # Token expires in 7 days
+            'iat': now,
+        }
+    
+    @staticmethod
+    def _refresh_payload(user, now: int) -> dict:
+        return {
+            'user_id': str(user.id),
+            'type': 'refresh',
+            'exp': now + 30 * 24 * 60 * 60,  # Refresh token expires in 30 days
+            'iat': now,
+        }
+    
     @staticmethod
     def generate_token(user) -> str:
         """
         Generate a JWT token for the given user
         """
-        payload = {
-            'user_id': str(user.id),
-            'phone_number': user.phone_number,
-            'exp': datetime.utcnow() + timedelta(days=7),  # Token expires in 7 days
-            'iat': datetime.utcnow(),
-        }
-        
-        return jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
+        return encode_token(JWTTokenGenerator._access_payload(user, int(time.time())))
     
     @staticmethod
     def generate_refresh_token(user) -> str:
         """
         Generate a refresh token for the given user
         """
-        payload = {
-            'user_id': str(user.id),
-            'type': 'refresh',
-            'exp': datetime.utcnow() + timedelta(days=30),  # Refresh token expires in 30 days
-            'iat': datetime.utcnow(),
-        }
-        
-        return jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
+        return encode_token(JWTTokenGenerator._refresh_payload(user, int(time.time())))
+    
+    @staticmethod
+    def generate_token_pair(user) -> Tuple[str, str]:
+        """
+        Generate access and refresh tokens for the given user in one signing pass
+        """
+        now = int(time.time())
+        return encode_tokens(
+            JWTTokenGenerator._access_payload(user, now),
+            JWTTokenGenerator._refresh_payload(user, now),
+        )
     
     @staticmethod
     def verify_token(token: str) -> Optional[dict]:
@@ -140,12 +312,28 @@ class JWTTokenGenerator:
         Verify and decode a JWT token
         """
         try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+            payload = decode_token(token)
             return payload
         except jwt.ExpiredSignatureError:
             return None
         except jwt.InvalidTokenError:
             return None
+    
+    @staticmethod
+    def verify_token_cached(token: str) -> Optional[dict]:
+        """
+        Verify and decode a JWT token, reusing the result for a few seconds
+        """
+        with _token_cache_lock:
+            payload = _token_cache.get(token)
+        if payload is not None:
+            return payload if payload.get('exp', float('inf')) > time.time() else None
+        
+        payload = JWTTokenGenerator.verify_token(token)
+        if payload is not None:
+            with _token_cache_lock:
+                _token_cache[token] = payload
+        return payload
 
 
 # OpenAPI Extensions for drf-spectacular
@@ -1,9 +1,31 @@
+import hashlib
+import hmac
 import redis
-import json
-import random
-import string
+import redis.asyncio
+import logging
+import orjson
+import secrets
 from django.conf import settings
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+# Bounded pool for the sync client used by the API views: under bursts callers
+# wait up to REDIS_POOL_TIMEOUT for a free connection instead of opening more.
+# A unix:// REDIS_URL selects a unix domain socket connection
+connection_pool = redis.BlockingConnectionPool.from_url(
+    settings.REDIS_URL,
+    max_connections=settings.REDIS_MAX_CONNECTIONS,
+    timeout=settings.REDIS_POOL_TIMEOUT,
+)
+
+# Shared by every async client (bot handlers) so connections are reused
+# instead of being opened per call
+async_connection_pool = redis.asyncio.BlockingConnectionPool.from_url(
+    settings.REDIS_URL,
+    max_connections=settings.REDIS_MAX_CONNECTIONS,
+)
 
 
 class RedisService:
@@ -12,7 +34,23 @@ class RedisService:
     """
     
     def __init__(self):
-        self.redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+        # Responses stay as bytes: orjson parses them directly and phone
+        # numbers are decoded only where they are returned
+        self.redis_client = redis.Redis(connection_pool=connection_pool)
+        self.async_client = redis.asyncio.Redis(connection_pool=async_connection_pool)
+        self.otp_pepper = settings.OTP_PEPPER.encode()
+        # Redeem an OTP and pop the user data staged for its phone number in
+        # one round-trip. The user data key is derived on the server, so this
+        # needs a single (non-cluster) Redis node
+        self._redeem_script = self.redis_client.register_script(
+            "local phone = redis.call('GET', KEYS[1]) "
+            "if not phone then return false end "
+            "redis.call('DEL', KEYS[1]) "
+            "local data_key = ARGV[1] .. phone "
+            "local data = redis.call('GET', data_key) "
+            "redis.call('UNLINK', data_key) "
+            "return {phone, data}"
+        )
     
     def generate_otp(self, length: int = None) -> str:
         """
@@ -20,98 +58,103 @@ class RedisService:
         """
         if length is None:
             length = settings.OTP_LENGTH
-        return ''.join(random.choices(string.digits, k=length))
+        return f"{secrets.randbelow(10 ** length):0{length}d}"
     
-    def store_otp(self, phone_number: str, otp: str, ttl: int = None) -> bool:
+    def hash_otp(self, otp: str) -> str:
         """
-        Store OTP in Redis with TTL using OTP as key
+        Derive the Redis key part for an OTP, so raw codes never reach Redis
         """
-        if ttl is None:
-            ttl = settings.OTP_TTL
-        
-        key = f"otp:{otp}"
-        otp_data = {
-            'otp': otp,
-            'phone_number': phone_number
-        }
-        try:
-            self.redis_client.setex(key, ttl, json.dumps(otp_data))
-            return True
-        except Exception as e:
-            print(f"Redis error storing OTP: {e}")
-            return False
+        return hmac.new(self.otp_pepper, otp.encode(), hashlib.sha256).hexdigest()
     
-    def get_otp_data(self, otp: str) -> Optional[Dict[str, Any]]:
+    def verify_and_fetch(self, otp: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
         """
-        Get OTP data from Redis using OTP as key
+        Verify OTP and return its phone number with the stored user data,
+        deleting both
         """
-        key = f"otp:{otp}"
+        key = f"otp:{self.hash_otp(otp)}"
         try:
-            data = self.redis_client.get(key)
-            return json.loads(data) if data else None
+            result = self._redeem_script(keys=[key], args=["user_data:"])
         except Exception as e:
-            print(f"Redis error getting OTP data: {e}")
-            return None
+            logger.warning("Redis error verifying OTP: %s", e)
+            return None, None
+        if not result:
+            return None, None
+        phone_number, data = result
+        return phone_number.decode(), orjson.loads(data) if data else None
     
-    def delete_otp(self, otp: str) -> bool:
+    async def astore_otp_with_user_data(
+        self, phone_number: str, otp: str, user_data: Dict[str, Any], ttl: int = None
+    ) -> bool:
         """
-        Delete OTP from Redis
+        Store OTP and user data in a single pipelined round-trip (async)
         """
-        key = f"otp:{otp}"
+        if ttl is None:
+            ttl = settings.OTP_TTL
+        
         try:
-            self.redis_client.delete(key)
+            pipe = self.async_client.pipeline(transaction=False)
+            pipe.setex(f"otp:{self.hash_otp(otp)}", ttl, phone_number)
+            pipe.setex(f"user_data:{phone_number}", ttl, orjson.dumps(user_data))
+            await pipe.execute()
             return True
         except Exception as e:
-            print(f"Redis error deleting OTP: {e}")
+            logger.warning("Redis error storing OTP with user data: %s", e)
             return False
     
-    def verify_otp(self, otp: str) -> Optional[Dict[str, Any]]:
+    def get_profile(self, version: str) -> Optional[bytes]:
         """
-        Verify OTP and return phone number if correct, then delete OTP
+        Get a rendered profile body from Redis
         """
-        otp_data = self.get_otp_data(otp)
-        if otp_data and otp_data.get('otp') == otp:
-            self.delete_otp(otp)
-            return otp_data
-        return None
+        key = f"profile:{version}"
+        try:
+            return self.redis_client.get(key)
+        except Exception as e:
+            logger.warning("Redis error getting profile: %s", e)
+            return None
     
-    def store_user_data(self, phone_number: str, user_data: Dict[str, Any], ttl: int = None) -> bool:
+    def store_profile(self, version: str, body: bytes, ttl: int = None) -> bool:
         """
-        Store user data temporarily in Redis
+        Store a rendered profile body in Redis with TTL
         """
         if ttl is None:
-            ttl = settings.OTP_TTL
+            ttl = settings.PROFILE_CACHE_TTL
         
-        key = f"user_data:{phone_number}"
+        key = f"profile:{version}"
         try:
-            self.redis_client.setex(key, ttl, json.dumps(user_data))
+            self.redis_client.setex(key, ttl, body)
             return True
         except Exception as e:
-            print(f"Redis error storing user data: {e}")
+            logger.warning("Redis error storing profile: %s", e)
             return False
     
-    def get_user_data(self, phone_number: str) -> Optional[Dict[str, Any]]:
+    def incr_auth_attempts(self, phone_number: str, ttl: int = None) -> int:
         """
-        Get user data from Redis
+        Count a password login attempt for the phone number, returns the total
         """
-        key = f"user_data:{phone_number}"
+        if ttl is None:
+            ttl = settings.AUTH_ATTEMPTS_TTL
+        
+        key = f"auth_attempts:{phone_number}"
         try:
-            data = self.redis_client.get(key)
-            return json.loads(data) if data else None
+            pipe = self.redis_client.pipeline()
+            pipe.incr(key)
+            pipe.expire(key, ttl)
+            count, _ = pipe.execute()
+            return count
         except Exception as e:
-            print(f"Redis error getting user data: {e}")
-            return None
+            logger.warning("Redis error counting auth attempts: %s", e)
+            return 0
     
-    def delete_user_data(self, phone_number: str) -> bool:
+    def reset_auth_attempts(self, phone_number: str) -> bool:
         """
-        Delete user data from Redis
+        Clear password login attempts for the phone number
         """
-        key = f"user_data:{phone_number}"
+        key = f"auth_attempts:{phone_number}"
         try:
             self.redis_client.delete(key)
             return True
         except Exception as e:
-            print(f"Redis error deleting user data: {e}")
+            logger.warning("Redis error resetting auth attempts: %s", e)
             return False
 
 
@@ -0,0 +1,25 @@
+import orjson
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.renderers import JSONRenderer
+
+_encode_default = JSONEncoder().default
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSON renderer backed by orjson, falls back to DRF's encoder for types
+    orjson does not handle natively (Decimal, lazy strings, querysets, ...)
+    """
+    
+    options = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        
+        renderer_context = renderer_context or {}
+        options = self.options
+        if self.get_indent(accepted_media_type, renderer_context):
+            options |= orjson.OPT_INDENT_2
+        
+        return orjson.dumps(data, default=_encode_default, option=options)
@@ -0,0 +1,250 @@
+import base64
+import json
+import threading
+import time
+from unittest import mock
+
+import jwt
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.test import SimpleTestCase, override_settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory
+
+from apps.base import auth
+from apps.base.auth import BasicAuth, decode_token, encode_token, encode_tokens
+from apps.base.redis_service import redis_service
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+class JWTCodecTests(SimpleTestCase):
+    """
+    The direct HS256 path must stay interchangeable with PyJWT
+    """
+
+    def setUp(self):
+        now = int(time.time())
+        self.payload = {
+            'user_id': '3f1c9a0e-5b7d-4e2a-9c61-8d2f4b0a7e15',
+            'phone_number': '998901234567',
+            'exp': now + 60,
+            'iat': now,
+        }
+
+    def test_matches_pyjwt_output(self):
+        token = encode_token(self.payload)
+        self.assertEqual(token, jwt.encode(self.payload, settings.SECRET_KEY, algorithm='HS256'))
+
+    def test_encode_tokens_signs_each_payload(self):
+        refresh = dict(self.payload, type='refresh')
+        self.assertEqual(
+            encode_tokens(self.payload, refresh),
+            (encode_token(self.payload), encode_token(refresh)),
+        )
+
+    def test_round_trip_with_pyjwt(self):
+        self.assertEqual(decode_token(encode_token(self.payload)), self.payload)
+        self.assertEqual(
+            decode_token(jwt.encode(self.payload, settings.SECRET_KEY, algorithm='HS256')),
+            self.payload,
+        )
+        self.assertEqual(
+            jwt.decode(encode_token(self.payload), settings.SECRET_KEY, algorithms=['HS256']),
+            self.payload,
+        )
+
+    def test_rejects_tampered_signature(self):
+        header, body, signature = encode_token(self.payload).split('.')
+        forged = _b64(bytes(b ^ 1 for b in base64.urlsafe_b64decode(signature + '=')))
+        with self.assertRaises(jwt.InvalidSignatureError):
+            decode_token('.'.join((header, body, forged)))
+
+    def test_rejects_tampered_body(self):
+        header, _, signature = encode_token(self.payload).split('.')
+        body = _b64(json.dumps(dict(self.payload, user_id='other')).encode())
+        with self.assertRaises(jwt.InvalidSignatureError):
+            decode_token('.'.join((header, body, signature)))
+
+    def test_rejects_foreign_alg(self):
+        for alg in ('none', 'HS512'):
+            header = _b64(json.dumps({'alg': alg, 'typ': 'JWT'}).encode())
+            _, body, signature = encode_token(self.payload).split('.')
+            with self.assertRaises(jwt.InvalidAlgorithmError):
+                decode_token('.'.join((header, body, signature)))
+        token = jwt.encode(self.payload, settings.SECRET_KEY, algorithm='HS512')
+        with self.assertRaises(jwt.InvalidAlgorithmError):
+            decode_token(token)
+
+    def test_rejects_wrong_segment_count(self):
+        token = encode_token(self.payload)
+        header, body, signature = token.split('.')
+        for bad in ('', header, f'{header}.{body}', f'{token}.{signature}'):
+            with self.assertRaises(jwt.DecodeError):
+                decode_token(bad)
+
+    def test_rejects_non_object_payload(self):
+        for value in ([1, 2], 'text', 42, None):
+            token = jwt.api_jws.encode(
+                json.dumps(value).encode(), settings.SECRET_KEY, algorithm='HS256'
+            )
+            with self.assertRaises(jwt.DecodeError):
+                decode_token(token)
+
+    def test_rejects_expired_token(self):
+        token = encode_token(dict(self.payload, exp=int(time.time()) - 1))
+        with self.assertRaises(jwt.ExpiredSignatureError):
+            decode_token(token)
+
+    def test_rejects_non_integer_exp(self):
+        token = encode_token(dict(self.payload, exp='soon'))
+        with self.assertRaises(jwt.DecodeError):
+            decode_token(token)
+
+
+class FakeRedis:
+    """
+    The few Redis commands the attempt limiter uses, atomic like the server
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def incr(self, key):
+        self.commands.append(('incr', key))
+
+    def expire(self, key, ttl):
+        self.commands.append(('expire', key))
+
+    def execute(self):
+        results = []
+        with self.redis.lock:
+            for command, key in self.commands:
+                if command == 'incr':
+                    self.redis.data[key] = self.redis.data.get(key, 0) + 1
+                    results.append(self.redis.data[key])
+                else:
+                    results.append(True)
+        return results
+
+
+@override_settings(
+    AUTH_MAX_ATTEMPTS=5,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class BasicAuthTests(SimpleTestCase):
+    """
+    Header parsing and the per phone number attempt limiter
+    """
+
+    phone_number = '998901234567'
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.user = auth.User(phone_number=self.phone_number, password=make_password('secret'))
+        self.hashes = 0
+        self.hashes_lock = threading.Lock()
+        self.factory = APIRequestFactory()
+
+        real_check_password = auth.check_password
+
+        def counting_check_password(password, encoded):
+            with self.hashes_lock:
+                self.hashes += 1
+            # Stands in for the slow hasher, widening any race window
+            time.sleep(0.01)
+            return real_check_password(password, encoded)
+
+        patches = [
+            mock.patch.object(redis_service, 'redis_client', self.redis),
+            mock.patch.object(auth, 'check_password', counting_check_password),
+            mock.patch.object(auth.User, 'objects'),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        auth.User.objects.filter.return_value.first.return_value = self.user
+
+    def request(self, header):
+        return self.factory.get('/', HTTP_AUTHORIZATION=header)
+
+    def basic(self, password, phone_number=None):
+        credentials = f'{phone_number or self.phone_number}:{password}'.encode()
+        return self.request('Basic ' + base64.b64encode(credentials).decode())
+
+    def attempts(self):
+        return self.redis.data.get(f'auth_attempts:{self.phone_number}', 0)
+
+    def test_valid_credentials(self):
+        self.assertEqual(BasicAuth().authenticate(self.basic('secret')), (self.user, None))
+
+    def test_unparseable_headers_are_ignored(self):
+        for header in (
+            '',
+            'Bearer token',
+            'Basic',
+            'Basic a b',
+            'Basic !!!not-base64!!!',
+            'Basic ' + base64.b64encode(b'no-colon').decode(),
+            'Basic ' + base64.b64encode(b'\xff\xfe:x').decode(),
+        ):
+            self.assertIsNone(BasicAuth().authenticate(self.request(header)), header)
+        self.assertEqual(self.hashes, 0)
+
+    def test_unknown_number_runs_a_dummy_hash(self):
+        auth.User.objects.filter.return_value.first.return_value = None
+        with mock.patch.object(auth.User, 'set_password') as set_password:
+            with self.assertRaisesMessage(AuthenticationFailed, 'Invalid phone number or password.'):
+                BasicAuth().authenticate(self.basic('secret'))
+        set_password.assert_called_once_with('secret')
+        self.assertEqual(self.attempts(), 1)
+
+    def test_refuses_after_max_failures(self):
+        for _ in range(5):
+            with self.assertRaisesMessage(AuthenticationFailed, 'Invalid phone number or password.'):
+                BasicAuth().authenticate(self.basic('wrong'))
+        with self.assertRaisesMessage(AuthenticationFailed, 'Too many login attempts.'):
+            BasicAuth().authenticate(self.basic('secret'))
+        self.assertEqual(self.hashes, 5)
+
+    def test_success_resets_attempts(self):
+        for _ in range(4):
+            with self.assertRaises(AuthenticationFailed):
+                BasicAuth().authenticate(self.basic('wrong'))
+        self.assertEqual(self.attempts(), 4)
+        BasicAuth().authenticate(self.basic('secret'))
+        self.assertEqual(self.attempts(), 0)
+
+    def test_concurrent_burst_is_capped(self):
+        barrier = threading.Barrier(20)
+
+        def attempt():
+            barrier.wait()
+            try:
+                BasicAuth().authenticate(self.basic('wrong'))
+            except AuthenticationFailed:
+                pass
+
+        threads = [threading.Thread(target=attempt) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.hashes, 5)
+        self.assertEqual(self.attempts(), 20)
@@ -4,38 +4,66 @@ from aiogram import Bot, Dispatcher, types
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.redis import DefaultKeyBuilder, RedisStorage
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
 from django.conf import settings
-from django.db import transaction
+from django.db import connection, transaction
 from asgiref.sync import sync_to_async
-from apps.base.redis_service import redis_service
-from apps.user.models import User
 import os
 import django
+from django.apps import apps
 
-# Django setup
+# Django setup (already done when loaded through a management command)
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
-django.setup()
+if not apps.ready:
+    django.setup()
+
+from apps.base.redis_service import redis_service  # noqa: E402
+from apps.user.models import User  # noqa: E402
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Async database functions
-@sync_to_async
-def get_user_by_phone(phone_number):
+# Lookup, tg_user_id link and state payload in a single thread hop.
+# Runs on the loop's default executor, whose threads never see a request
+# cycle, so the connection is handed back to the pool after each call
+@sync_to_async(thread_sensitive=False)
+def resolve_contact_user(phone_number, tg_user_id, first_name, last_name):
     try:
-        return User.objects.get(phone_number=phone_number)
-    except User.DoesNotExist:
-        return None
+        user = User.objects.filter(phone_number=phone_number).only(
+            'id', 'phone_number', 'first_name', 'last_name', 'tg_user_id', 'is_verified'
+        ).first()
+        
+        if user is None:
+            return False, {
+                'phone_number': phone_number,
+                'first_name': first_name or '',
+                'last_name': last_name or '',
+                'tg_user_id': tg_user_id,
+                'is_verified': False
+            }
+        
+        # Update user's tg_user_id if not set
+        if not user.tg_user_id:
+            User.objects.filter(pk=user.pk).update(tg_user_id=tg_user_id)
+        
+        return True, {
+            'id': str(user.id),
+            'phone_number': user.phone_number,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'is_verified': user.is_verified
+        }
+    finally:
+        connection.close()
 
 @sync_to_async
 def get_user_by_tg_id(tg_user_id):
-    try:
-        return User.objects.get(tg_user_id=tg_user_id)
-    except User.DoesNotExist:
-        return None
+    return User.objects.filter(tg_user_id=tg_user_id).only(
+        'id', 'phone_number', 'first_name', 'last_name', 'is_verified'
+    ).first()
 
 @sync_to_async
 def create_user(phone_number, first_name, last_name, tg_user_id=None, is_verified=False):
@@ -49,7 +77,14 @@ def create_user(phone_number, first_name, last_name, tg_user_id=None, is_verifie
 
 # Bot and dispatcher
 bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
-storage = MemoryStorage()
+# FSM state lives in Redis next to the OTPs, sharing the async connection pool.
+# It holds phone numbers and names, so it expires instead of piling up
+storage = RedisStorage(
+    redis=redis_service.async_client,
+    key_builder=DefaultKeyBuilder(prefix='fsm', with_bot_id=True),
+    state_ttl=settings.TELEGRAM_FSM_STATE_TTL,
+    data_ttl=settings.TELEGRAM_FSM_DATA_TTL
+)
 dp = Dispatcher(storage=storage)
 
 
@@ -58,28 +93,45 @@ class UserStates(StatesGroup):
     waiting_for_login = State()
 
 
-def get_contact_keyboard():
-    """Create keyboard for sharing contact"""
-    keyboard = ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="📱 Kontaktni ulashish", request_contact=True)]
-        ],
-        resize_keyboard=True,
-        one_time_keyboard=True
-    )
-    return keyboard
+# Keyboards and static texts are immutable, so they are built once
+CONTACT_KEYBOARD = ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="📱 Kontaktni ulashish", request_contact=True)]
+    ],
+    resize_keyboard=True,
+    one_time_keyboard=True
+)
+
+MAIN_KEYBOARD = ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="/login")],
+        [KeyboardButton(text="/help")]
+    ],
+    resize_keyboard=True
+)
+
+WELCOME_TEXT = """
+🤖 *Xush kelibsiz!*
 
+Bu bot orqali siz OTP kodi bilan tizimga kirishingiz mumkin.
 
-def get_main_keyboard():
-    """Create main menu keyboard"""
-    keyboard = ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="/login")],
-            [KeyboardButton(text="/help")]
-        ],
-        resize_keyboard=True
-    )
-    return keyboard
+Boshlash uchun kontaktni ulashing:
+    """
+
+HELP_TEXT = """
+📖 *Yordam*
+
+*Buyruqlar:*
+/start - Botni boshlash va kontakt ulashish
+/login - OTP kodi olish
+/help - Yordam
+
+*Qadamlar:*
+1️⃣ /start - Botni boshlang
+2️⃣ Kontaktni ulashing
+3️⃣ /login - OTP kodi oling
+4️⃣ Login sahifasida OTP kodini kiriting
+    """
 
 
 @dp.message(Command("start"))
@@ -87,18 +139,10 @@ async def cmd_start(message: types.Message, state: FSMContext):
     """Handle /start command"""
     await state.clear()
     
-    welcome_text = """
-🤖 *Xush kelibsiz!*
-
-Bu bot orqali siz OTP kodi bilan tizimga kirishingiz mumkin.
-
-Boshlash uchun kontaktni ulashing:
-    """
-    
     await message.answer(
-        welcome_text,
+        WELCOME_TEXT,
         parse_mode="Markdown",
-        reply_markup=get_contact_keyboard()
+        reply_markup=CONTACT_KEYBOARD
     )
     await state.set_state(UserStates.waiting_for_contact)
 
@@ -113,53 +157,31 @@ async def process_contact(message: types.Message, state: FSMContext):
         if phone_number.startswith('+'):
             phone_number = phone_number[1:]
         
-        # Store phone number in state
-        await state.update_data(phone_number=phone_number)
-        
         # Check if user exists in database
-        user = await get_user_by_phone(phone_number)
+        user_exists, user_data = await resolve_contact_user(
+            phone_number,
+            message.from_user.id,
+            message.from_user.first_name,
+            message.from_user.last_name,
+        )
+        await state.update_data(phone_number=phone_number, user_data=user_data)
         
-        if user:
-            # Update user's tg_user_id if not set
-            if not user.tg_user_id:
-                user.tg_user_id = message.from_user.id
-                await sync_to_async(user.save)()
-            
-            user_data = {
-                'id': str(user.id),
-                'phone_number': user.phone_number,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'is_verified': user.is_verified
-            }
-            await state.update_data(user_data=user_data)
-            
-            unknown_name = 'Noma\'lum'
+        unknown_name = 'Noma\'lum'
+        if user_exists:
             success_text = f"""
 ✅ *Kontakt qabul qilindi!*
 
 Telefon raqam: `{phone_number}`
-Ism: {user.first_name or unknown_name}
+Ism: {user_data['first_name'] or unknown_name}
 
 OTP kodi olish uchun /login buyrug'ini bosing."""
             
         else:
-            # User doesn't exist, create temporary data
-            user_data = {
-                'phone_number': phone_number,
-                'first_name': message.from_user.first_name or '',
-                'last_name': message.from_user.last_name or '',
-                'tg_user_id': message.from_user.id,
-                'is_verified': False
-            }
-            await state.update_data(user_data=user_data)
-            
-            unknown_name = 'Noma\'lum'
             success_text = f"""
 ✅ *Kontakt qabul qilindi!*
 
 Telefon raqam: `{phone_number}`
-Ism: {message.from_user.first_name or unknown_name}
+Ism: {user_data['first_name'] or unknown_name}
 
 ⚠️ *Eslatma:* Bu raqam tizimda ro'yxatdan o'tmagan. 
 OTP kodi olish uchun /login buyrug'ini bosing.
@@ -168,14 +190,14 @@ OTP kodi olish uchun /login buyrug'ini bosing.
         await message.answer(
             success_text,
             parse_mode="Markdown",
-            reply_markup=get_main_keyboard()
+            reply_markup=MAIN_KEYBOARD
         )
         await state.set_state(UserStates.waiting_for_login)
         
     else:
         await message.answer(
             "❌ Iltimos, kontaktni to'g'ri ulashing!",
-            reply_markup=get_contact_keyboard()
+            reply_markup=CONTACT_KEYBOARD
         )
 
 
@@ -207,7 +229,7 @@ async def cmd_login(message: types.Message, state: FSMContext):
         else:
             await message.answer(
                 "❌ Avval kontaktni ulashing! /start buyrug'ini bosing.",
-                reply_markup=get_contact_keyboard()
+                reply_markup=CONTACT_KEYBOARD
             )
             await state.set_state(UserStates.waiting_for_contact)
             return
@@ -215,13 +237,12 @@ async def cmd_login(message: types.Message, state: FSMContext):
     # Generate OTP
     otp = redis_service.generate_otp()
     
-    # Store OTP in Redis
-    success = redis_service.store_otp(phone_number, otp)
+    # Store OTP and user data in Redis for later use
+    success = await redis_service.astore_otp_with_user_data(
+        phone_number, otp, user_data.get('user_data', {})
+    )
     
     if success:
-        # Store user data in Redis for later use
-        redis_service.store_user_data(phone_number, user_data.get('user_data', {}))
-        
         otp_text = f"""
 🔐 *OTP kodi yaratildi!*
 
@@ -237,38 +258,23 @@ Bu kodni login sahifasida kiriting.
         await message.answer(
             otp_text,
             parse_mode="Markdown",
-            reply_markup=get_main_keyboard()
+            reply_markup=MAIN_KEYBOARD
         )
         
     else:
         await message.answer(
             "❌ Xatolik yuz berdi. Qaytadan urinib ko'ring.",
-            reply_markup=get_main_keyboard()
+            reply_markup=MAIN_KEYBOARD
         )
 
 
 @dp.message(Command("help"))
 async def cmd_help(message: types.Message):
     """Handle /help command"""
-    help_text = """
-📖 *Yordam*
-
-*Buyruqlar:*
-/start - Botni boshlash va kontakt ulashish
-/login - OTP kodi olish
-/help - Yordam
-
-*Qadamlar:*
-1️⃣ /start - Botni boshlang
-2️⃣ Kontaktni ulashing
-3️⃣ /login - OTP kodi oling
-4️⃣ Login sahifasida OTP kodini kiriting
-    """
-    
     await message.answer(
-        help_text,
+        HELP_TEXT,
         parse_mode="Markdown",
-        reply_markup=get_main_keyboard()
+        reply_markup=MAIN_KEYBOARD
     )
 
 
@@ -280,17 +286,17 @@ async def handle_other_messages(message: types.Message, state: FSMContext):
     if current_state == UserStates.waiting_for_contact:
         await message.answer(
             "❌ Iltimos, kontaktni ulashing!",
-            reply_markup=get_contact_keyboard()
+            reply_markup=CONTACT_KEYBOARD
         )
     elif current_state == UserStates.waiting_for_login:
         await message.answer(
             "ℹ️ OTP kodi olish uchun /login buyrug'ini bosing.",
-            reply_markup=get_main_keyboard()
+            reply_markup=MAIN_KEYBOARD
         )
     else:
         await message.answer(
             "❓ Noma'lum buyruq. /help yordam olish uchun.",
-            reply_markup=get_main_keyboard()
+            reply_markup=MAIN_KEYBOARD
         )
 
 
@@ -1,12 +1,6 @@
 import asyncio
-import os
-import django
 from django.core.management.base import BaseCommand
 
-
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
-django.setup()
-
 from apps.telegram.bot import start_bot
 
 
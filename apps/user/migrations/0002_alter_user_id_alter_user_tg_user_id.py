@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-15 18:13
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("user", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="user",
+            name="id",
+            field=models.UUIDField(
+                default=uuid.uuid4,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+                unique=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="user",
+            name="tg_user_id",
+            field=models.BigIntegerField(blank=True, db_index=True, null=True),
+        ),
+    ]
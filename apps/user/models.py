@@ -36,7 +36,7 @@ class User(AbstractUser, BaseModel):
 
     username = None
     phone_number = models.CharField(max_length=20, unique=True)
-    tg_user_id = models.BigIntegerField(null=True, blank=True)
+    tg_user_id = models.BigIntegerField(null=True, blank=True, db_index=True)
     first_name = models.CharField(max_length=150, blank=True)
     last_name = models.CharField(max_length=150, blank=True)
     email = models.EmailField(unique=True, blank=True, null=True)
@@ -2,11 +2,6 @@ from rest_framework import serializers
 from .models import User
 
 
-class LoginSerializer(serializers.Serializer):
-    phone_number = serializers.CharField(max_length=20, help_text="User's phone number")
-    password = serializers.CharField(write_only=True, help_text="User's password")
-
-
 class RefreshTokenSerializer(serializers.Serializer):
     refresh_token = serializers.CharField(help_text="Refresh token to get new access token")
 
@@ -21,12 +16,6 @@ class UserProfileSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
-class LoginResponseSerializer(serializers.Serializer):
-    access_token = serializers.CharField(help_text="JWT access token")
-    refresh_token = serializers.CharField(help_text="JWT refresh token")
-    user = UserProfileSerializer(help_text="User profile information")
-
-
 class RefreshResponseSerializer(serializers.Serializer):
     access_token = serializers.CharField(help_text="New JWT access token")
 
@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.base.auth import invalidate_cached_user
+from apps.user.models import User
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_auth_cache(sender, instance, **kwargs):
+    """
+    Drop the cached copy used by JWT authentication whenever a user changes
+    """
+    invalidate_cached_user(instance.pk)
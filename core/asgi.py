@@ -1,7 +1,37 @@
 import os
+import threading
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+from core.urls import HEALTH_BODY  # noqa: E402
+
+# Only the server warms the auth cache, not every process that sets up
+# Django (migrate, shell, run_bot, tests)
+if settings.AUTH_CACHE_WARMUP:
+    from apps.base.auth import warm_user_cache
+
+    threading.Thread(
+        target=warm_user_cache,
+        args=(settings.AUTH_CACHE_WARMUP_SIZE,),
+        daemon=True,
+    ).start()
+
+HEALTH_PATHS = frozenset(("/", "/health/"))
+HEALTH_HEADERS = [
+    (b"content-type", b"application/json"),
+    (b"content-length", str(len(HEALTH_BODY)).encode()),
+]
+
+
+async def application(scope, receive, send):
+    # Answer liveness probes here, before Django's middleware and URL resolver
+    if scope["type"] == "http" and scope["path"] in HEALTH_PATHS:
+        await send({"type": "http.response.start", "status": 200, "headers": HEALTH_HEADERS})
+        await send({"type": "http.response.body", "body": HEALTH_BODY})
+        return
+    await django_application(scope, receive, send)
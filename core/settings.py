@@ -44,7 +44,6 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -54,6 +53,13 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# In production STATIC_ROOT is served by the web server / CDN, so WhiteNoise
+# stays out of the request path unless explicitly enabled
+SERVE_STATIC = config("SERVE_STATIC", default=DEBUG, cast=bool)
+
+if SERVE_STATIC:
+    MIDDLEWARE.insert(1, "whitenoise.middleware.WhiteNoiseMiddleware")
+
 ROOT_URLCONF = "core.urls"
 
 TEMPLATES = [
@@ -87,9 +93,26 @@ DATABASES = {
         'PASSWORD': config('DB_PASSWORD', default='password'),
         'HOST': config('DB_HOST', default='localhost'),
         'PORT': config('DB_PORT', default='5432'),
+        # Under ASGI (uvicorn, see Makefile) each request runs in its own
+        # thread and connections are per thread, so persistent connections are
+        # never reused; connections come from the pool below instead
+        'CONN_MAX_AGE': 0,
+        # Must be on when connecting through pgbouncer in transaction mode
+        'DISABLE_SERVER_SIDE_CURSORS': config('DB_DISABLE_SERVER_SIDE_CURSORS', default=False, cast=bool),
+        'OPTIONS': {
+            'sslmode': config('DB_SSLMODE', default='prefer'),
+            'application_name': 'elearn',
+        },
     }
 }
 
+if config('DB_POOL', default=True, cast=bool):
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+        'max_size': config('DB_POOL_MAX_SIZE', default=20, cast=int),
+        'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),
+    }
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -111,7 +134,7 @@ LANGUAGE_CODE = "en-us"
 
 TIME_ZONE = "UTC"
 
-USE_I18N = True
+USE_I18N = False
 
 USE_TZ = True
 
@@ -143,11 +166,27 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 AUTH_USER_MODEL = 'user.User'
 
 
+################################
+### AUTH CACHE CONFIGURATION ###
+################################
+
+AUTH_USER_CACHE_SIZE = 4096
+AUTH_USER_CACHE_TTL = 30
+AUTH_MISSING_USER_CACHE_SIZE = 10000
+AUTH_MISSING_USER_CACHE_TTL = 60
+AUTH_CACHE_WARMUP = config('AUTH_CACHE_WARMUP', default=False, cast=bool)
+AUTH_CACHE_WARMUP_SIZE = 1000
+AUTH_TOKEN_CACHE_SIZE = 4096
+AUTH_TOKEN_CACHE_TTL = 5
+
+
 ###########################
 ### REDIS CONFIGURATION ###
 ###########################
 
 REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
+REDIS_MAX_CONNECTIONS = config('REDIS_MAX_CONNECTIONS', default=32, cast=int)
+REDIS_POOL_TIMEOUT = config('REDIS_POOL_TIMEOUT', default=0.5, cast=float)
 
 
 ##############################
@@ -156,6 +195,8 @@ REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
 
 TELEGRAM_BOT_TOKEN = config('TELEGRAM_BOT_TOKEN', default='')
 TELEGRAM_WEBHOOK_URL = config('TELEGRAM_WEBHOOK_URL', default='')
+TELEGRAM_FSM_STATE_TTL = 24 * 60 * 60
+TELEGRAM_FSM_DATA_TTL = 24 * 60 * 60
 
 
 #########################
@@ -164,6 +205,22 @@ TELEGRAM_WEBHOOK_URL = config('TELEGRAM_WEBHOOK_URL', default='')
 
 OTP_LENGTH = 6
 OTP_TTL = 120
+OTP_PEPPER = config('OTP_PEPPER', default=SECRET_KEY)
+
+
+################################
+### AUTH ATTEMPTS LIMITATION ###
+################################
+
+AUTH_MAX_ATTEMPTS = 5
+AUTH_ATTEMPTS_TTL = 60
+
+
+###################################
+### PROFILE CACHE CONFIGURATION ###
+###################################
+
+PROFILE_CACHE_TTL = 300
 
 
 ####################################
@@ -174,12 +231,15 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'apps.base.auth.JWTAuthentication',
         'apps.base.auth.BasicAuth',
-        'rest_framework.authentication.BasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.DjangoModelPermissionsOrAnonReadOnly',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'apps.base.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
 
@@ -2,17 +2,21 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from django.http import JsonResponse
+from django.http import HttpResponse
+
+
+HEALTH_BODY = b'{"detail":"Healthy!"}'
 
 
 def index(request):
-    return JsonResponse({"detail": "Healthy!"})
+    return HttpResponse(HEALTH_BODY, content_type="application/json")
 
 
+# Health checks first so probes match on the first patterns tried
 urlpatterns = [
-    path("admin/", admin.site.urls),
-    path("", index),
     path("health/", index),
+    path("", index),
+    path("admin/", admin.site.urls),
 ]
 
 urlpatterns += [